@@ -6,7 +6,10 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from pathlib import Path
-from src.utils import find_files, find_folders, create_melted_df
+from src.utils import find_files, find_folders
+from src.dataplane import DataPlane
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from statsmodels.stats.diagnostic import het_breuschpagan, het_white
 import statsmodels.api as sm
 import matplotlib.pyplot as plt
@@ -27,6 +30,24 @@ st.set_page_config(
     layout="wide"
 )
 
+
+def active_session_ids():
+    try:
+        session_mgr = runtime.get_instance()._session_mgr
+        return {info.session.id for info in session_mgr.list_active_sessions()}
+    except (AttributeError, RuntimeError):
+        return None
+
+
+@st.cache_resource
+def get_data_plane():
+    return DataPlane(active_sessions=active_session_ids)
+
+
+data_plane = get_data_plane()
+session_id = get_script_run_ctx().session_id
+data_plane.start_run(session_id)
+
 st.sidebar.title("Settings")
 
 directory_option = st.sidebar.selectbox(
@@ -80,16 +101,15 @@ st.sidebar.markdown("---")
 st.sidebar.subheader("Plot Controls")
 show_residuals = st.sidebar.checkbox("Show Residuals Plot", value=True)
 
-saratio = pd.read_csv(saratios_dir / 'pulses_0.05.csv', index_col=0)
-saratio.index = pd.to_numeric(saratio.index, errors='coerce')
-dmf = pd.read_csv(DMF_DIR / selected_damping, index_col=0)
-dmf.index = pd.to_numeric(dmf.index, errors='coerce')
-
-period_min, period_max = period_range
-saratio = saratio[(saratio.index >= period_min) & (saratio.index <= period_max)]
-dmf = dmf[(dmf.index >= period_min) & (dmf.index <= period_max)]
-
-df_melted = create_melted_df(saratio, dmf, selected_damping)
+entry = data_plane.get(
+    saratios_dir / 'pulses_0.05.csv',
+    DMF_DIR / selected_damping,
+    ab=selected_folder,
+    damping=selected_damping,
+    session_id=session_id,
+)
+saratio, dmf = entry.frames(period_range)
+df_melted = data_plane.melted(entry, period_range, session_id=session_id)
 
 x_centered = df_melted['SaRatio']
 y_centered = df_melted['DMF']
@@ -393,14 +413,14 @@ fig_grid = make_subplots(rows=2, cols=2, horizontal_spacing=0.08, vertical_spaci
     subplot_titles=[f'$\\xi={d.replace("pulses_", "").replace(".csv", "")}$' for d in selected_dampings])
 
 for i, damping_file in enumerate(selected_dampings):
-    dmf_grid = pd.read_csv(DMF_DIR / damping_file, index_col=0)
-    dmf_grid.index = pd.to_numeric(dmf_grid.index, errors='coerce')
-    saratio_grid = pd.read_csv(saratios_dir / 'pulses_0.05.csv', index_col=0)
-    saratio_grid.index = pd.to_numeric(saratio_grid.index, errors='coerce')
-    period_min, period_max = period_range
-    saratio_grid = saratio_grid[(saratio_grid.index >= period_min) & (saratio_grid.index <= period_max)]
-    dmf_grid = dmf_grid[(dmf_grid.index >= period_min) & (dmf_grid.index <= period_max)]
-    df_melted_grid = create_melted_df(saratio_grid, dmf_grid, damping_file)
+    entry_grid = data_plane.get(
+        saratios_dir / 'pulses_0.05.csv',
+        DMF_DIR / damping_file,
+        ab=selected_folder,
+        damping=damping_file,
+        session_id=session_id,
+    )
+    df_melted_grid = data_plane.melted(entry_grid, period_range, session_id=session_id)
     x = df_melted_grid['SaRatio']
     y = df_melted_grid['DMF']
     X = sm.add_constant(x)
@@ -539,4 +559,17 @@ for i in range(1, 5):
             title_text='DMF' if show_y_title else '',
             row=i, col=j
         )
-# fig_wavelet_grid.write_image('sdratio_model_vs_dmf_grid.pdf')
\ No newline at end of file
+# fig_wavelet_grid.write_image('sdratio_model_vs_dmf_grid.pdf')
+
+
+st.sidebar.markdown("---")
+with st.sidebar.expander("Memory Usage"):
+    summary = data_plane.summary()
+    st.write(
+        f"Shared: {summary['shared_mb']:.1f} / {summary['budget_mb']:.0f} MB "
+        f"({summary['frames']} frames, {summary['entries']} entries, {summary['evictions']} evictions)"
+    )
+    st.write(f"{summary['sessions']} {summary['session_source']} sessions")
+    usage = data_plane.usage()
+    usage['session'] = np.where(usage['session'] == session_id, 'this session', usage['session'].str[:8])
+    st.dataframe(usage, hide_index=True, use_container_width=True)
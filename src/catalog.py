@@ -0,0 +1,193 @@
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.utils import find_files
+
+RECORDS_DIR = Path("records/")
+CATALOG_DIR = Path("catalog/")
+ACCELERATIONS_FILE = "accelerations.f64"
+INDEX_FILE = "index.parquet"
+HEADER_PATTERN = re.compile(r"(\w+)\s*=\s*(\S+)")
+
+
+@dataclass(frozen=True)
+class Record:
+    name: str
+    delta: float
+    xini: float
+    acceleration: np.ndarray
+
+    @property
+    def n(self):
+        return len(self.acceleration)
+
+    @property
+    def duration(self):
+        return self.n * self.delta
+
+    @property
+    def time(self):
+        return self.xini + self.delta * np.arange(self.n)
+
+
+def parse_header(line: str) -> dict:
+    header = dict(HEADER_PATTERN.findall(line))
+    missing = {"N", "Delta"} - header.keys()
+    if missing:
+        raise ValueError(f"Record header {line.strip()!r} is missing {sorted(missing)}")
+    return {"n": int(header["N"]), "delta": float(header["Delta"]), "xini": float(header.get("Xini", 0.0))}
+
+
+def parse_record(path: Path) -> tuple[dict, np.ndarray]:
+    with open(path) as f:
+        header = parse_header(f.readline())
+        values = np.array(f.read().split(), dtype=np.float64)
+    if len(values) < header["n"]:
+        raise ValueError(f"Record {path} declares N={header['n']} but has {len(values)} values")
+    return header, values[:header["n"]]
+
+
+def build_catalog(
+    record_paths: list[Path],
+    catalog_dir: Path = CATALOG_DIR,
+    *,
+    workers: int = None,
+    chunksize: int = 64,
+) -> "RecordCatalog":
+    catalog_dir = Path(catalog_dir)
+    catalog_dir.mkdir(parents=True, exist_ok=True)
+    record_paths = [Path(p) for p in record_paths]
+    suffix = f".{os.getpid()}.tmp"
+    accelerations_tmp = catalog_dir / f"{ACCELERATIONS_FILE}{suffix}"
+    index_tmp = catalog_dir / f"{INDEX_FILE}{suffix}"
+    rows = []
+    offset = 0
+    try:
+        with open(accelerations_tmp, "wb") as buffer, ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, (header, values) in zip(record_paths, pool.map(parse_record, record_paths, chunksize=chunksize)):
+                buffer.write(values.tobytes())
+                rows.append({"name": path.name, "offset": offset, **header})
+                offset += header["n"]
+        index = pd.DataFrame(rows, columns=["name", "offset", "n", "delta", "xini"]).astype(
+            {"offset": np.int64, "n": np.int64, "delta": np.float64, "xini": np.float64}
+        )
+        index.to_parquet(index_tmp, index=False)
+        os.replace(accelerations_tmp, catalog_dir / ACCELERATIONS_FILE)
+        os.replace(index_tmp, catalog_dir / INDEX_FILE)
+    finally:
+        accelerations_tmp.unlink(missing_ok=True)
+        index_tmp.unlink(missing_ok=True)
+    return RecordCatalog(catalog_dir)
+
+
+def build_catalog_from_dir(records_dir: Path = RECORDS_DIR, catalog_dir: Path = CATALOG_DIR, **kwargs) -> "RecordCatalog":
+    names = find_files(records_dir, files_only=True)
+    return build_catalog([records_dir / name for name in names], catalog_dir, **kwargs)
+
+
+class RecordCatalog:
+    def __init__(self, catalog_dir: Path = CATALOG_DIR):
+        catalog_dir = Path(catalog_dir)
+        self.index = pd.read_parquet(catalog_dir / INDEX_FILE)
+        self.names = self.index["name"].to_numpy()
+        self.offsets = self.index["offset"].to_numpy(dtype=np.int64)
+        self.lengths = self.index["n"].to_numpy(dtype=np.int64)
+        self.deltas = self.index["delta"].to_numpy(dtype=np.float64)
+        self.xinis = self.index["xini"].to_numpy(dtype=np.float64)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        total = int(self.lengths.sum())
+        accelerations_path = catalog_dir / ACCELERATIONS_FILE
+        size = os.path.getsize(accelerations_path) if accelerations_path.exists() else 0
+        if size != total * np.dtype(np.float64).itemsize:
+            raise ValueError(
+                f"{accelerations_path} has {size} bytes but {INDEX_FILE} expects {total} float64 values, rebuild the catalog"
+            )
+        if total:
+            self.accelerations = np.memmap(accelerations_path, dtype=np.float64, mode="r", shape=(total,))
+        else:
+            self.accelerations = np.empty(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.index)
+
+    def position(self, key) -> int:
+        if isinstance(key, str):
+            try:
+                return self.positions[key]
+            except KeyError:
+                raise KeyError(f"Unknown record {key!r}") from None
+        return range(len(self))[key]
+
+    def acceleration(self, key) -> np.ndarray:
+        i = self.position(key)
+        start = self.offsets[i]
+        return self.accelerations[start:start + self.lengths[i]]
+
+    def __getitem__(self, key) -> Record:
+        i = self.position(key)
+        return Record(
+            name=self.names[i],
+            delta=float(self.deltas[i]),
+            xini=float(self.xinis[i]),
+            acceleration=self.acceleration(i),
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def select(self, *, min_length=None, max_length=None, dt=None, rtol=1e-9) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if min_length is not None:
+            mask &= self.lengths >= min_length
+        if max_length is not None:
+            mask &= self.lengths <= max_length
+        if dt is not None:
+            mask &= np.isclose(self.deltas, dt, rtol=rtol, atol=0.0)
+        return np.flatnonzero(mask)
+
+    def iter_batches(self, batch_size=256, *, indices=None, sort_by: str = None):
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices, dtype=np.int64)
+        if sort_by == "length":
+            indices = indices[np.argsort(self.lengths[indices], kind="stable")]
+        elif sort_by == "dt":
+            indices = indices[np.lexsort((self.lengths[indices], self.deltas[indices]))]
+        elif sort_by is not None:
+            raise ValueError(f"sort_by must be 'length', 'dt' or None, got {sort_by!r}")
+        for start in range(0, len(indices), batch_size):
+            yield [self[int(i)] for i in indices[start:start + batch_size]]
+
+    def iter_by_dt(self, batch_size=256):
+        dts, codes = np.unique(self.deltas, return_inverse=True)
+        for code, dt in enumerate(dts):
+            for batch in self.iter_batches(batch_size, indices=np.flatnonzero(codes == code), sort_by="length"):
+                yield dt, batch
+
+    def padded(self, indices) -> tuple[np.ndarray, np.ndarray]:
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = self.lengths[indices]
+        batch = np.zeros((len(indices), lengths.max(initial=0)), dtype=np.float64)
+        for row, i in enumerate(indices):
+            batch[row, :lengths[row]] = self.acceleration(int(i))
+        return batch, lengths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a memory-mapped ground-motion record catalog")
+    parser.add_argument("records_dir", type=Path, nargs="?", default=RECORDS_DIR)
+    parser.add_argument("--catalog-dir", type=Path, default=CATALOG_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    catalog = build_catalog_from_dir(args.records_dir, args.catalog_dir, workers=args.workers)
+    print(f"{len(catalog)} records, {catalog.accelerations.nbytes / 1e6:.1f} MB in {args.catalog_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.utils import read_results_csv
+
+CACHE_DIR = Path(".cache/dataplane")
+DEFAULT_BUDGET_MB = float(os.environ.get("MPWAVELETS_DATAPLANE_BUDGET_MB", 256))
+SESSION_TTL = 120.0
+MELTED_PER_ENTRY = 4
+
+
+def read_only(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+def save_npy(path: Path, array: np.ndarray):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def frame_key(csv_path: Path) -> str:
+    return str(Path(csv_path).resolve())
+
+
+@dataclass(frozen=True)
+class SharedFrame:
+    periods: np.ndarray
+    cases: np.ndarray
+    values: np.ndarray
+
+    @property
+    def nbytes(self):
+        return self.periods.nbytes + self.cases.nbytes + self.values.nbytes
+
+    def period_slice(self, period_min, period_max) -> slice:
+        start = np.searchsorted(self.periods, period_min, side="left")
+        stop = np.searchsorted(self.periods, period_max, side="right")
+        return slice(int(start), int(stop))
+
+    def frame(self, rows: slice = slice(None)) -> pd.DataFrame:
+        return pd.DataFrame(self.values[rows], index=self.periods[rows], columns=self.cases, copy=False)
+
+
+def load_shared_frame(csv_path: Path, cache_dir: Path = CACHE_DIR) -> SharedFrame:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    resolved = Path(csv_path).resolve()
+    digest = hashlib.sha1(str(resolved).encode()).hexdigest()[:16]
+    stem = f"{resolved.parent.name}__{resolved.stem}__{digest}"
+    paths = {part: cache_dir / f"{stem}.{part}.npy" for part in ("periods", "cases", "values")}
+    csv_mtime = os.path.getmtime(resolved)
+    if not all(p.exists() and os.path.getmtime(p) >= csv_mtime for p in paths.values()):
+        df = read_results_csv(resolved)
+        df = df[df.index.notna()].sort_index()
+        save_npy(paths["periods"], df.index.to_numpy(dtype=np.float64))
+        save_npy(paths["cases"], df.columns.to_numpy(dtype=str))
+        save_npy(paths["values"], np.ascontiguousarray(df.to_numpy(dtype=np.float64)))
+    return SharedFrame(
+        periods=read_only(np.load(paths["periods"])),
+        cases=read_only(np.load(paths["cases"])),
+        values=np.load(paths["values"], mmap_mode="r"),
+    )
+
+
+@dataclass(frozen=True)
+class MeltedArrays:
+    periods: np.ndarray
+    cases: pd.Categorical
+    saratio: np.ndarray
+    dmf: np.ndarray
+    damping: pd.Categorical
+
+    @property
+    def nbytes(self):
+        return self.periods.nbytes + self.cases.nbytes + self.saratio.nbytes + self.dmf.nbytes + self.damping.nbytes
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {"T": self.periods, "Case": self.cases, "SaRatio": self.saratio, "DMF": self.dmf, "damping": self.damping},
+            copy=False,
+        )
+
+
+def melt(saratio: pd.DataFrame, dmf: pd.DataFrame, damping: str) -> MeltedArrays:
+    n_periods, n_cases = saratio.shape
+    if not (dmf.index.equals(saratio.index) and dmf.columns.equals(saratio.columns)):
+        dmf = dmf.reindex(index=saratio.index, columns=saratio.columns)
+    return MeltedArrays(
+        periods=read_only(np.tile(saratio.index.to_numpy(), n_cases)),
+        cases=pd.Categorical.from_codes(np.repeat(np.arange(n_cases), n_periods), categories=saratio.columns),
+        saratio=read_only(saratio.to_numpy().ravel(order='F')),
+        dmf=read_only(dmf.to_numpy().ravel(order='F')),
+        damping=pd.Categorical.from_codes(np.zeros(n_periods * n_cases, dtype=np.int8), categories=[damping]),
+    )
+
+
+@dataclass
+class Entry:
+    key: tuple
+    ab: str
+    damping: str
+    saratio: SharedFrame
+    dmf: SharedFrame
+    melted_cache: OrderedDict = field(default_factory=OrderedDict)
+
+    @property
+    def melted_bytes(self):
+        return sum(melted.nbytes for melted in self.melted_cache.values())
+
+    def slices(self, period_range) -> tuple[slice, slice]:
+        return self.saratio.period_slice(*period_range), self.dmf.period_slice(*period_range)
+
+    def frames(self, period_range) -> tuple[pd.DataFrame, pd.DataFrame]:
+        saratio_rows, dmf_rows = self.slices(period_range)
+        return self.saratio.frame(saratio_rows), self.dmf.frame(dmf_rows)
+
+
+@dataclass
+class SessionUsage:
+    keys: set = field(default_factory=set)
+    melted_keys: set = field(default_factory=set)
+    last_seen: float = field(default_factory=time.monotonic)
+
+
+class DataPlane:
+    def __init__(
+        self,
+        *,
+        budget_mb: float = DEFAULT_BUDGET_MB,
+        cache_dir: Path = CACHE_DIR,
+        session_ttl: float = SESSION_TTL,
+        active_sessions: Optional[Callable[[], Optional[set]]] = None,
+    ):
+        self.budget_bytes = int(budget_mb * 1024 ** 2)
+        self.cache_dir = Path(cache_dir)
+        self.session_ttl = session_ttl
+        self.active_sessions = active_sessions
+        self.frames: dict[str, SharedFrame] = {}
+        self.loading: dict[str, Future] = {}
+        self.entries: OrderedDict = OrderedDict()
+        self.sessions: dict[str, SessionUsage] = {}
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    @property
+    def total_bytes(self):
+        with self.lock:
+            return sum(frame.nbytes for frame in self.frames.values()) + sum(
+                entry.melted_bytes for entry in self.entries.values()
+            )
+
+    def frame(self, csv_path: Path) -> SharedFrame:
+        key = frame_key(csv_path)
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                return frame
+            future = self.loading.get(key)
+            owner = future is None
+            if owner:
+                future = self.loading[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            frame = load_shared_frame(Path(key), self.cache_dir)
+        except BaseException as e:
+            with self.lock:
+                del self.loading[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            frame = self.frames.setdefault(key, frame)
+            del self.loading[key]
+        future.set_result(frame)
+        return frame
+
+    def get(self, saratio_path: Path, dmf_path: Path, *, ab: str, damping: str, session_id: str = None) -> Entry:
+        key = (frame_key(saratio_path), frame_key(dmf_path))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None:
+            saratio = self.frame(saratio_path)
+            dmf = self.frame(dmf_path)
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is None:
+                    entry = Entry(
+                        key=key,
+                        ab=ab,
+                        damping=damping,
+                        saratio=self.frames.setdefault(key[0], saratio),
+                        dmf=self.frames.setdefault(key[1], dmf),
+                    )
+                    self.entries[key] = entry
+                    self.evict(keep=key)
+        if session_id is not None:
+            with self.lock:
+                self.session(session_id).keys.add(key)
+        return entry
+
+    def melted(self, entry: Entry, period_range, *, session_id: str = None) -> pd.DataFrame:
+        saratio_rows, dmf_rows = entry.slices(period_range)
+        melted_key = (saratio_rows.start, saratio_rows.stop, dmf_rows.start, dmf_rows.stop)
+        with self.lock:
+            melted = entry.melted_cache.get(melted_key)
+            if melted is not None:
+                entry.melted_cache.move_to_end(melted_key)
+        if melted is None:
+            computed = melt(entry.saratio.frame(saratio_rows), entry.dmf.frame(dmf_rows), entry.damping)
+            with self.lock:
+                melted = entry.melted_cache.setdefault(melted_key, computed)
+                while len(entry.melted_cache) > MELTED_PER_ENTRY:
+                    entry.melted_cache.popitem(last=False)
+                if entry.key in self.entries:
+                    self.evict(keep=entry.key)
+        if session_id is not None:
+            with self.lock:
+                self.session(session_id).melted_keys.add((entry.key, melted_key))
+        return melted.frame()
+
+    def evict(self, keep=None):
+        with self.lock:
+            while self.total_bytes > self.budget_bytes:
+                candidates = [key for key in self.entries if key != keep]
+                if not candidates:
+                    break
+                del self.entries[candidates[0]]
+                self.evictions += 1
+                self.drop_unused_frames()
+
+    def drop_unused_frames(self):
+        with self.lock:
+            used = {path_key for key in self.entries for path_key in key}
+            for key in [key for key in self.frames if key not in used]:
+                del self.frames[key]
+
+    def prune_sessions(self) -> str:
+        with self.lock:
+            active = self.active_sessions() if self.active_sessions is not None else None
+            if active is not None:
+                for closed in [s for s in self.sessions if s not in active]:
+                    del self.sessions[closed]
+                return "active"
+            now = time.monotonic()
+            for stale in [s for s, usage in self.sessions.items() if now - usage.last_seen > self.session_ttl]:
+                del self.sessions[stale]
+            return "recently active"
+
+    def session(self, session_id: str) -> SessionUsage:
+        with self.lock:
+            usage = self.sessions.setdefault(session_id, SessionUsage())
+            usage.last_seen = time.monotonic()
+            return usage
+
+    def start_run(self, session_id: str):
+        with self.lock:
+            usage = self.session(session_id)
+            usage.keys.clear()
+            usage.melted_keys.clear()
+
+    def session_bytes(self, usage: SessionUsage) -> int:
+        frame_keys = {path_key for key in usage.keys if key in self.entries for path_key in key}
+        frame_bytes = sum(self.frames[key].nbytes for key in frame_keys if key in self.frames)
+        melted_bytes = 0
+        for entry_key, melted_key in usage.melted_keys:
+            entry = self.entries.get(entry_key)
+            melted = entry.melted_cache.get(melted_key) if entry is not None else None
+            melted_bytes += melted.nbytes if melted is not None else 0
+        return frame_bytes + melted_bytes
+
+    def usage(self) -> pd.DataFrame:
+        with self.lock:
+            self.prune_sessions()
+            rows = [
+                {
+                    "session": session_id,
+                    "entries": sum(key in self.entries for key in usage.keys),
+                    "referenced_mb": self.session_bytes(usage) / 1024 ** 2,
+                }
+                for session_id, usage in self.sessions.items()
+            ]
+            return pd.DataFrame(rows, columns=["session", "entries", "referenced_mb"])
+
+    def summary(self) -> dict:
+        with self.lock:
+            session_source = self.prune_sessions()
+            return {
+                "entries": len(self.entries),
+                "frames": len(self.frames),
+                "sessions": len(self.sessions),
+                "session_source": session_source,
+                "shared_mb": self.total_bytes / 1024 ** 2,
+                "budget_mb": self.budget_bytes / 1024 ** 2,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,280 @@
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scipy import stats
+
+from src.utils import find_files, find_folders, read_results_csv
+
+RESULTS_DIR = Path("results/")
+SA_RATIOS_DIR = RESULTS_DIR / "saratios"
+DMF_DIR = RESULTS_DIR / "dmfs"
+COEFFICIENTS_PATH = RESULTS_DIR / "coefficients.parquet"
+SA_RATIO_FILE = "pulses_0.05.csv"
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def parse_damping(filename: str) -> float:
+    return float(Path(filename).stem.replace("pulses_", ""))
+
+
+def fit_line(x: np.ndarray, y: np.ndarray, *, force_through_origin=False):
+    if force_through_origin:
+        slope = stats.linregress(x - 1, y - 1).slope
+        return slope, 1 - slope
+    result = stats.linregress(x, y)
+    return result.slope, result.intercept
+
+
+def fit_coefficients(
+    saratios_dir: Path = SA_RATIOS_DIR,
+    dmf_dir: Path = DMF_DIR,
+    *,
+    period_range=(0.1, 3.0),
+    force_through_origin=False,
+) -> pd.DataFrame:
+    period_min, period_max = period_range
+    dmfs = {}
+    for damping_file in find_files(dmf_dir, only_csv=True):
+        dmf = read_results_csv(dmf_dir / damping_file)
+        dmfs[parse_damping(damping_file)] = dmf[(dmf.index >= period_min) & (dmf.index <= period_max)]
+
+    rows = []
+    for ab_folder in find_folders(saratios_dir):
+        saratio = read_results_csv(saratios_dir / ab_folder / SA_RATIO_FILE)
+        saratio = saratio[(saratio.index >= period_min) & (saratio.index <= period_max)]
+        for damping, dmf in dmfs.items():
+            dmf = dmf.reindex(index=saratio.index, columns=saratio.columns)
+            x = saratio.to_numpy(dtype=np.float64).ravel(order='F')
+            y = dmf.to_numpy(dtype=np.float64).ravel(order='F')
+            mask = np.isfinite(x) & np.isfinite(y)
+            if mask.sum() < 2 or np.ptp(x[mask]) == 0:
+                continue
+            slope, intercept = fit_line(x[mask], y[mask], force_through_origin=force_through_origin)
+            rows.append({"ab": ab_folder, "damping": damping, "slope": slope, "intercept": intercept})
+
+    return pd.DataFrame(rows, columns=["ab", "damping", "slope", "intercept"]).sort_values(["ab", "damping"], ignore_index=True)
+
+
+def save_coefficients(table: pd.DataFrame, path: Path = COEFFICIENTS_PATH):
+    table.astype({"damping": np.float64, "slope": np.float64, "intercept": np.float64}).to_parquet(path, index=False)
+
+
+def as_float_array(values) -> np.ndarray:
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks() if values.num_chunks != 1 else values.chunk(0)
+    if isinstance(values, pa.Array):
+        if values.type != pa.float64():
+            values = values.cast(pa.float64())
+        return values.to_numpy(zero_copy_only=values.null_count == 0)
+    return np.asarray(values, dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class DampingCurve:
+    dampings: np.ndarray
+    slopes: np.ndarray
+    intercepts: np.ndarray
+
+    def coefficients(self, damping):
+        damping = as_float_array(damping)
+        outside = ~np.isfinite(damping) | (damping < self.dampings[0]) | (damping > self.dampings[-1])
+        if np.any(outside):
+            raise ValueError(
+                f"Damping must be within the fitted range [{self.dampings[0]}, {self.dampings[-1]}], "
+                f"got {np.asarray(damping)[outside].ravel()[:5].tolist()}"
+            )
+        return (
+            np.interp(damping, self.dampings, self.slopes),
+            np.interp(damping, self.dampings, self.intercepts),
+        )
+
+
+class DMFPredictor:
+    def __init__(self, table: pd.DataFrame):
+        table = table[np.isfinite(table["slope"]) & np.isfinite(table["intercept"])]
+        if table.empty:
+            raise ValueError("Coefficient table has no finite coefficients")
+        self.curves = {}
+        for ab, group in table.sort_values("damping").groupby("ab", sort=True):
+            self.curves[ab] = DampingCurve(
+                dampings=group["damping"].to_numpy(dtype=np.float64),
+                slopes=group["slope"].to_numpy(dtype=np.float64),
+                intercepts=group["intercept"].to_numpy(dtype=np.float64),
+            )
+
+    @classmethod
+    def from_file(cls, path: Path = COEFFICIENTS_PATH):
+        return cls(pd.read_parquet(path))
+
+    @property
+    def ab_combinations(self):
+        return list(self.curves)
+
+    def curve(self, ab: str) -> DampingCurve:
+        try:
+            return self.curves[ab]
+        except KeyError:
+            raise KeyError(f"Unknown AB combination {ab!r}, expected one of {self.ab_combinations}") from None
+
+    def coefficients(self, ab: str, damping):
+        return self.curve(ab).coefficients(damping)
+
+    def predict(self, ab: str, sa_ratio, damping, *, out: np.ndarray = None) -> np.ndarray:
+        x = as_float_array(sa_ratio)
+        slope, intercept = self.coefficients(ab, damping)
+        if out is None:
+            return x * slope + intercept
+        np.multiply(x, slope, out=out)
+        return np.add(out, intercept, out=out)
+
+    def predict_table(self, ab: str, table: pa.Table) -> pa.Table:
+        dmf = self.predict(ab, table.column("sa_ratio"), table.column("damping"))
+        return pa.table({"dmf": pa.array(dmf, type=pa.float64())})
+
+
+def read_arrow_stream(body: bytes) -> pa.Table:
+    with pa.ipc.open_stream(pa.py_buffer(body)) as reader:
+        return reader.read_all()
+
+
+def write_arrow_stream(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def make_handler(predictor: DMFPredictor):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def send_body(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_json(self, status: int, payload):
+            self.send_body(status, json.dumps(payload).encode(), "application/json")
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/ab_combinations":
+                self.send_json(200, predictor.ab_combinations)
+            elif url.path == "/coefficients":
+                query = parse_qs(url.query)
+                try:
+                    ab = query["ab"][0]
+                    dampings = [float(d) for d in query["damping"]]
+                    slope, intercept = predictor.coefficients(ab, dampings)
+                except (KeyError, ValueError) as e:
+                    self.send_json(400, {"error": str(e)})
+                    return
+                self.send_json(200, {"damping": dampings, "slope": slope.tolist(), "intercept": intercept.tolist()})
+            else:
+                self.send_json(404, {"error": f"Unknown path {url.path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/predict":
+                self.send_json(404, {"error": f"Unknown path {url.path}"})
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            content_type = self.headers.get("Content-Type", ARROW_STREAM_TYPE)
+            try:
+                if content_type.startswith("application/json"):
+                    payload = json.loads(body)
+                    if not isinstance(payload, dict):
+                        raise ValueError("JSON body must be an object with ab, sa_ratio and damping")
+                    dmf = predictor.predict(payload["ab"], payload["sa_ratio"], payload["damping"])
+                    self.send_json(200, {"dmf": dmf.tolist()})
+                else:
+                    ab = parse_qs(url.query)["ab"][0]
+                    result = predictor.predict_table(ab, read_arrow_stream(body))
+                    self.send_body(200, write_arrow_stream(result), ARROW_STREAM_TYPE)
+            except (KeyError, TypeError, ValueError, pa.ArrowException) as e:
+                self.send_json(400, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictionHandler
+
+
+def serve(predictor: DMFPredictor, host="127.0.0.1", port=8600):
+    server = ThreadingHTTPServer((host, port), make_handler(predictor))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def benchmark(predictor: DMFPredictor, ab: str = None, *, n=1_000_000, repeat=10, seed=42) -> pd.DataFrame:
+    ab = ab if ab is not None else predictor.ab_combinations[0]
+    curve = predictor.curve(ab)
+    rng = np.random.default_rng(seed)
+    sa_ratio = rng.uniform(0.5, 4.5, n)
+    damping = rng.uniform(curve.dampings[0], curve.dampings[-1], n)
+    arrow_batch = pa.table({"sa_ratio": sa_ratio, "damping": damping})
+    out = np.empty(n)
+    cases = {
+        "numpy, scalar damping": lambda: predictor.predict(ab, sa_ratio, float(np.median(curve.dampings)), out=out),
+        "numpy, per-row damping": lambda: predictor.predict(ab, sa_ratio, damping, out=out),
+        "arrow, per-row damping": lambda: predictor.predict_table(ab, arrow_batch),
+        "arrow ipc round trip": lambda: read_arrow_stream(
+            write_arrow_stream(predictor.predict_table(ab, read_arrow_stream(write_arrow_stream(arrow_batch))))
+        ),
+    }
+    rows = []
+    for case, run in cases.items():
+        run()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        elapsed = (time.perf_counter() - start) / repeat
+        rows.append({"ab": ab, "case": case, "n": n, "seconds": elapsed, "rows_per_second": n / elapsed})
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DMF prediction from fitted SdRatio coefficients")
+    parser.add_argument("--coefficients", type=Path, default=COEFFICIENTS_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fit = commands.add_parser("fit")
+    fit.add_argument("--period-min", type=float, default=0.1)
+    fit.add_argument("--period-max", type=float, default=3.0)
+    fit.add_argument("--force-through-origin", action="store_true")
+
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8600)
+
+    bench = commands.add_parser("bench")
+    bench.add_argument("--ab")
+    bench.add_argument("-n", type=int, default=1_000_000)
+    bench.add_argument("--repeat", type=int, default=10)
+
+    args = parser.parse_args(argv)
+    if args.command == "fit":
+        table = fit_coefficients(
+            period_range=(args.period_min, args.period_max),
+            force_through_origin=args.force_through_origin,
+        )
+        save_coefficients(table, args.coefficients)
+        print(table.to_string(index=False))
+    elif args.command == "serve":
+        serve(DMFPredictor.from_file(args.coefficients), args.host, args.port)
+    else:
+        print(benchmark(DMFPredictor.from_file(args.coefficients), args.ab, n=args.n, repeat=args.repeat).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -85,3 +85,9 @@ def create_melted_df(ratio_df, dmf_df, damping):
     df_melted['damping'] = damping
     
     return df_melted
+
+
+def read_results_csv(path: Path) -> DataFrame:
+    df = read_csv(path, index_col=0)
+    df.index = pd.to_numeric(df.index, errors='coerce')
+    return df